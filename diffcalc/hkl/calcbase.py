@@ -93,7 +93,12 @@ class HklCalculatorBase(object):
         return pos, virtualAnglesReadback
 
     def _verify_pos_map_to_hkl(self, h, k, l, wavelength, pos):
-        hkl, _ = self.anglesToHkl(pos, wavelength)
+        # Only hkl is needed here, so skip the virtual angle calculation that
+        # anglesToHkl would also perform
+        hkl = self._anglesToHkl(pos.inRadians(), wavelength)
+        self._verify_hkl_matches(h, k, l, hkl, pos)
+
+    def _verify_hkl_matches(self, h, k, l, hkl, pos):
         e = 0.001
         if ((abs(hkl[0] - h) > e) or (abs(hkl[1] - k) > e) or 
             (abs(hkl[2] - l) > e)):
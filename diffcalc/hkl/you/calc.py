@@ -16,7 +16,7 @@
 # along with Diffcalc.  If not, see <http://www.gnu.org/licenses/>.
 ###
 
-from math import pi, sin, cos, tan, acos, asin, atan, atan2, sqrt
+from math import pi, sin, cos, tan, acos, asin, atan, atan2, sqrt, hypot
 from itertools import product
 from diffcalc import settings
 
@@ -29,17 +29,18 @@ except ImportError:
 
 from diffcalc.log import logging
 from diffcalc.hkl.calcbase import HklCalculatorBase
-from diffcalc.hkl.you.geometry import create_you_matrices, calcMU, calcPHI, \
-    calcCHI, calcETA
+from diffcalc.hardware import cut_angle_at
+from diffcalc.hkl.you.geometry import calcMU, calcPHI, calcCHI, calcETA, \
+    apply_mu, apply_eta, apply_chi, apply_phi, sample_trig, phi_to_lab
 from diffcalc.hkl.you.geometry import YouPosition
 from diffcalc.util import DiffcalcException, bound, angle_between_vectors,\
     y_rotation
-from diffcalc.util import cross3, z_rotation, x_rotation
+from diffcalc.util import z_rotation, x_rotation
 from diffcalc.ub.calc import PaperSpecificUbCalcStrategy
 
 from diffcalc.settings import NUNAME
 logger = logging.getLogger("diffcalc.hkl.you.calc")
-I = matrix('1 0 0; 0 1 0; 0 0 1')
+I = matrix(((1, 0, 0), (0, 1, 0), (0, 0, 1)))
 
 SMALL = 1e-6
 TORAD = pi / 180
@@ -53,11 +54,12 @@ def is_small(x):
 
 
 def sign(x):
-    if is_small(x):
-        return 0
-    if x > 0:
+    # Equivalent to returning 0 when is_small(x), but cheaper as it is
+    # called for most candidate angles. NaN falls through to -1.
+    if x >= SMALL:
         return 1
-    # x < 0
+    if x > -SMALL:
+        return 0
     return -1
 
 
@@ -75,27 +77,43 @@ def cut_at_minus_pi(value):
 
 def _calc_N(Q, n):
     """Return N as described by Equation 31"""
-    Q = normalised(Q)
-    n = normalised(n)
-    if is_small(angle_between_vectors(Q, n)):
+    # Worked through on scalars as this is called for every reflection
+    [[q0], [q1], [q2]] = Q.tolist()
+    [[n0], [n1], [n2]] = n.tolist()
+    q_len = sqrt(q0 * q0 + q1 * q1 + q2 * q2)
+    q0, q1, q2 = q0 / q_len, q1 / q_len, q2 / q_len
+    n_len = sqrt(n0 * n0 + n1 * n1 + n2 * n2)
+    n0, n1, n2 = n0 / n_len, n1 / n_len, n2 / n_len
+    angle = acos(bound(q0 * n0 + q1 * n1 + q2 * n2))
+    if is_small(angle) or is_small(angle - pi):
         # Replace the reference vector with an alternative vector from Eq.(78) 
-        idx_min, _ = min(enumerate([abs(Q[0, 0]), abs(Q[1, 0]), abs(Q[2, 0])]), key=lambda v: v[1])
+        q = [q0, q1, q2]
+        abs_q = [abs(q0), abs(q1), abs(q2)]
+        idx_min = abs_q.index(min(abs_q))
         idx_1, idx_2 = [idx for idx in range(3) if idx != idx_min]
-        qval = sqrt(Q[idx_1, 0] * Q[idx_1, 0] + Q[idx_2, 0] * Q[idx_2, 0])
-        n[idx_min, 0] = qval
-        n[idx_1, 0] = -Q[idx_min, 0] * Q[idx_1, 0] / qval
-        n[idx_2, 0] = -Q[idx_min, 0] * Q[idx_2, 0] / qval
-        if is_small(norm(n)):
-            n[idx_min, 0] = 0
-            n[idx_1, 0] =  Q[idx_2, 0] / qval
-            n[idx_2, 0] = -Q[idx_1, 0] / qval
-    Qxn = cross3(Q, n)
-    QxnxQ = cross3(Qxn, Q)
-    QxnxQ = normalised(QxnxQ)
-    Qxn = normalised(Qxn)
-    return matrix([[Q[0, 0], QxnxQ[0, 0], Qxn[0, 0]],
-                   [Q[1, 0], QxnxQ[1, 0], Qxn[1, 0]],
-                   [Q[2, 0], QxnxQ[2, 0], Qxn[2, 0]]])
+        qval = hypot(q[idx_1], q[idx_2])
+        n = [0., 0., 0.]
+        n[idx_min] = qval
+        n[idx_1] = -q[idx_min] * q[idx_1] / qval
+        n[idx_2] = -q[idx_min] * q[idx_2] / qval
+        if is_small(sqrt(n[0] * n[0] + n[1] * n[1] + n[2] * n[2])):
+            n[idx_min] = 0
+            n[idx_1] =  q[idx_2] / qval
+            n[idx_2] = -q[idx_1] / qval
+        n0, n1, n2 = n
+    # Qxn
+    x0 = q1 * n2 - q2 * n1
+    x1 = q2 * n0 - q0 * n2
+    x2 = q0 * n1 - q1 * n0
+    # QxnxQ
+    y0 = x1 * q2 - x2 * q1
+    y1 = x2 * q0 - x0 * q2
+    y2 = x0 * q1 - x1 * q0
+    x_len = sqrt(x0 * x0 + x1 * x1 + x2 * x2)
+    y_len = sqrt(y0 * y0 + y1 * y1 + y2 * y2)
+    return matrix([[q0, y0 / y_len, x0 / x_len],
+                   [q1, y1 / y_len, x1 / x_len],
+                   [q2, y2 / y_len, x2 / x_len]])
 
 
 def _calc_angle_between_naz_and_qaz(theta, alpha, tau):
@@ -116,13 +134,36 @@ def youAnglesToHkl(pos, wavelength, UBmatrix):
     """Calculate miller indices from position in radians.
     """
 
-    [MU, DELTA, NU, ETA, CHI, PHI] = create_you_matrices(*pos.totuple())
+    return _hkl_from_q_phi(_calc_q_phi(pos, 2 * pi / wavelength),
+                           UBmatrix.I.tolist())
 
-    q_lab = (NU * DELTA - I) * matrix([[0], [2 * pi / wavelength], [0]])   # 12
 
-    hkl = UBmatrix.I * PHI.I * CHI.I * ETA.I * MU.I * q_lab
+def _hkl_from_q_phi(q_phi, UBinverse_rows):
+    """Return hkl for Q in the phi frame given the rows of UB inverse.
+    """
+    # Written out in full as a 3x3 matrix product costs more to set up than
+    # to evaluate
+    x, y, z = q_phi
+    [[a, b, c], [d, e, f], [g, h, i]] = UBinverse_rows
+    return a * x + b * y + c * z, d * x + e * y + f * z, g * x + h * y + i * z
 
-    return hkl[0, 0], hkl[1, 0], hkl[2, 0]
+
+def _calc_q_phi(pos, k):
+    """Return the components of Q in the phi frame for position in radians
+    and wavevector k.
+    """
+    mu, delta, nu, eta, chi, phi = pos.totuple()
+
+    # q_lab = (NU * DELTA - I) * [0, k, 0]^T only needs the middle column of
+    # NU * DELTA:
+    cos_delta = cos(delta)
+    q_lab = (k * sin(delta), k * (cos(nu) * cos_delta - 1), k * sin(nu) * cos_delta)  # (12)
+
+    # Rotate back into the phi frame one circle at a time
+    v = apply_mu(q_lab, -mu)
+    v = apply_eta(v, -eta)
+    v = apply_chi(v, -chi)
+    return apply_phi(v, -phi)
 
 
 def _tidy_degenerate_solutions(pos, constraints):
@@ -146,7 +187,7 @@ def _tidy_degenerate_solutions(pos, constraints):
                 print ('DEGENERATE: with chi=0, phi and eta are colinear:'
                        'choosing eta = delta/2 by adding % 7.3f to eta and '
                        'removing it from phi. (mu=%s=0 only)' % (eta_diff * TODEG, NUNAME))
-                print '            original:', original
+                print ('            original: %s' % (original,))
 
     elif delta_constrained_to_0 and eta_constrained_to_0 and phi_not_constrained:
         # constrained to horizontal 4-circle like mode
@@ -159,30 +200,29 @@ def _tidy_degenerate_solutions(pos, constraints):
                 print ('DEGENERATE: with chi=90, phi and mu are colinear: choosing'
                        ' mu = %s/2 by adding % 7.3f to mu and to phi. '
                        '(delta=eta=0 only)' % (NUNAME, mu_diff * TODEG))
-                print '            original:', original
+                print ('            original: %s' % (original,))
 
     return pos
 
 
 def _theta_and_qaz_from_detector_angles(delta, nu):
     # Equation 19:
-    cos_2theta = cos(delta) * cos(nu)
-    theta = acos(cos_2theta) / 2.
-    sgn = sign(sin(2. * theta))
-    qaz = atan2(sgn * sin(delta), sgn * cos(delta) * sin(nu))
-    return theta, qaz
+    cos_delta = cos(delta)
+    cos_2theta = cos_delta * cos(nu)
+    two_theta = acos(cos_2theta)
+    sgn = sign(sin(two_theta))
+    qaz = atan2(sgn * sin(delta), sgn * cos_delta * sin(nu))
+    return two_theta / 2., qaz
 
 
 class YouUbCalcStrategy(PaperSpecificUbCalcStrategy):
 
     def calculate_q_phi(self, pos):
 
-        [MU, DELTA, NU, ETA, CHI, PHI] = create_you_matrices(*pos.totuple())
-        # Equation 12: Compute the momentum transfer vector in the lab  frame
-        y = matrix('0; 1; 0')
-        q_lab = (NU * DELTA - I) * y
-        # Transform this into the phi frame.
-        return PHI.I * CHI.I * ETA.I * MU.I * q_lab
+        # Equation 12 for a unit wavevector, rotated into the phi frame
+        # without building the six circle matrices
+        x, y, z = _calc_q_phi(pos, 1)
+        return matrix([[x], [y], [z]])
 
 
 UNREACHABLE_MSG = (
@@ -198,6 +238,8 @@ class YouHklCalculator(HklCalculatorBase):
                                    raiseExceptionsIfAnglesDoNotMapBackToHkl)
         self.constraints = constraints
         self.parameter_manager = constraints  # TODO: remove need for this attr
+        self._ub_cache = (None, None)  # (UB, UB.I.tolist())
+        self._hkl_cache = (None, None, None)  # (UB, (pos, wavelength), hkl)
 
     def __str__(self):
         return self.constraints.__str__()
@@ -211,13 +253,46 @@ class YouHklCalculator(HklCalculatorBase):
     def _get_ubmatrix(self):
         return self._getUBMatrix()  # for consistency
 
+    def _get_ubmatrix_inverse_rows(self):
+        """Return UB inverse as a list of rows.
+        """
+        # UB is replaced rather than modified in place when it changes, so
+        # the cached inverse is valid for as long as UB is the same object
+        UB = self._get_ubmatrix()
+        cached_UB, cached_rows = self._ub_cache
+        if UB is not cached_UB:
+            cached_rows = UB.I.tolist()
+            self._ub_cache = (UB, cached_rows)
+        return cached_rows
+
     def repr_mode(self):
         return repr(self.constraints.all)
 
     def _anglesToHkl(self, pos, wavelength):
         """Calculate miller indices from position in radians.
         """
-        return youAnglesToHkl(pos, wavelength, self._get_ubmatrix())
+        # The same position is often converted repeatedly, e.g. when hkl is
+        # read back while the diffractometer is not moving
+        UB = self._get_ubmatrix()
+        key = (pos.totuple(), wavelength)
+        cached_UB, cached_key, cached_hkl = self._hkl_cache
+        if UB is cached_UB and key == cached_key:
+            return cached_hkl
+        UB_inverse_rows = self._get_ubmatrix_inverse_rows()
+        hkl = _hkl_from_q_phi(_calc_q_phi(pos, 2 * pi / wavelength),
+                              UB_inverse_rows)
+        self._hkl_cache = (UB, key, hkl)
+        return hkl
+
+    def _verify_positions_map_to_hkl(self, h, k, l, wavelength, positions):
+        """Check that all positions (in degrees) map back to hkl.
+        """
+        wavevector = 2 * pi / wavelength
+        UB_inverse_rows = self._get_ubmatrix_inverse_rows()
+        for pos in positions:
+            hkl = _hkl_from_q_phi(_calc_q_phi(pos.inRadians(), wavevector),
+                                  UB_inverse_rows)
+            self._verify_hkl_matches(h, k, l, hkl, pos)
 
     def _anglesToVirtualAngles(self, pos, _wavelength):
         """Calculate pseudo-angles in radians from position in radians.
@@ -231,25 +306,32 @@ class YouHklCalculator(HklCalculatorBase):
 
         theta, qaz = _theta_and_qaz_from_detector_angles(delta, nu)      # (19)
 
-        [MU, DELTA, NU, ETA, CHI, PHI] = create_you_matrices(mu,
-                                           delta, nu, eta, chi, phi)
-        Z = MU * ETA * CHI * PHI
-        D = NU * DELTA
+        # Both the surface normal and the reference vector are rotated into
+        # the lab frame, so evaluate the sample circle trig only once
+        trig = sample_trig(mu, eta, chi, phi)
+
+        def _to_lab(v_phi):
+            [[x], [y], [z]] = v_phi.tolist()
+            return phi_to_lab((x, y, z), trig)
 
-        # Compute incidence and outgoing angles bin and betaout
-        surf_nphi = Z * self._get_surf_nphi()
-        kin = matrix([[0],[1],[0]])
-        kout = D * matrix([[0],[1],[0]])
-        betain = angle_between_vectors(kin, surf_nphi) - pi / 2.
-        betaout = pi / 2. - angle_between_vectors(kout, surf_nphi)
+        # Compute incidence and outgoing angles bin and betaout. kin is
+        # [0, 1, 0] and kout = NU * DELTA * kin, both of unit length.
+        sx, sy, sz = _to_lab(self._get_surf_nphi())
+        surf_norm = sqrt(sx * sx + sy * sy + sz * sz)
+        cos_delta = cos(delta)
+        kout_dot_surf = sin(delta) * sx + cos(nu) * cos_delta * sy + sin(nu) * cos_delta * sz
+        betain = acos(bound(sy / surf_norm)) - pi / 2.
+        betaout = pi / 2. - acos(bound(kout_dot_surf / surf_norm))
 
         if settings.include_reference:
-            n_lab = Z * self._get_n_phi()
-            alpha = asin(bound((-n_lab[1, 0])))
-            naz = atan2(n_lab[0, 0], n_lab[2, 0])                            # (20)
+            n_lab = _to_lab(self._get_n_phi())
+            alpha = asin(bound(-n_lab[1]))
+            naz = atan2(n_lab[0], n_lab[2])                                  # (20)
 
-            cos_tau = cos(alpha) * cos(theta) * cos(naz - qaz) + \
-                      sin(alpha) * sin(theta)
+            st, ct = sin(theta), cos(theta)
+            sa, ca = sin(alpha), cos(alpha)
+
+            cos_tau = ca * ct * cos(naz - qaz) + sa * st
             tau = acos(bound(cos_tau))                                       # (23)
 
             # Compute Tau using the dot product directly (THIS ALSO WORKS)
@@ -258,10 +340,10 @@ class YouHklCalculator(HklCalculatorBase):
             # q_lab = matrix([[1],[0],[0]]) if norm == 0 else q_lab * (1/norm)
             # tau_from_dot_product = acos(bound(dot3(q_lab, n_lab)))
 
-            sin_beta = 2 * sin(theta) * cos(tau) - sin(alpha)
+            sin_beta = 2 * st * cos_tau - sa
             beta = asin(bound(sin_beta))                                     # (24)
 
-            psi = next(self._calc_psi(alpha, theta, tau, qaz, naz))
+            psi, = self._calc_psi(alpha, theta, tau, qaz, naz)
 
             return {'theta': theta, 'ttheta': 2 * theta, 'qaz': qaz, 'alpha': alpha,
                     'naz': naz, 'tau': tau, 'psi': psi, 'beta': beta,
@@ -279,37 +361,43 @@ class YouHklCalculator(HklCalculatorBase):
         _hw_pos = settings.hardware.get_position()
         _you_pos = settings.geometry.physical_angles_to_internal_position(_hw_pos).totuple()
 
-        metric = lambda (a, b): 2.* asin(abs(sin((a - b) * TORAD / 2.))) * TODEG
+        metric = lambda a, b: 2.* asin(abs(sin((a - b) * TORAD / 2.))) * TODEG
 
         for _pos, _ in pos_virtual_angles_pairs_in_degrees:
             pos_pairs = zip(_pos.totuple(), _you_pos)
-            absolute_distances.append([metric(p)for p in pos_pairs])
+            absolute_distances.append([metric(a, b) for a, b in pos_pairs])
 
         min_distances = [min(d) for d in zip(*absolute_distances)]
-        relative_distances = [sorted([round(vl - mn, 2) for (vl, mn) in zip(ab, min_distances)], reverse=True)
-                               for ab in absolute_distances]
+        # Find the shortest distance while building the list for the log
+        relative_distances = []
+        shortest_solution_index = 0
+        for i, ab in enumerate(absolute_distances):
+            distance = sorted([round(vl - mn, 2) for (vl, mn) in zip(ab, min_distances)], reverse=True)
+            relative_distances.append(distance)
+            if distance < relative_distances[shortest_solution_index]:
+                shortest_solution_index = i
 
-        shortest_solution_index, _ = min(enumerate(relative_distances), key=lambda x: x[1])
         pos, virtual_angles = pos_virtual_angles_pairs_in_degrees[shortest_solution_index]
 
         if logger.isEnabledFor(logging.DEBUG):
-            msg = ('Multiple sample solutions found (choosing solution with '
-                   'shortest distance to all-zeros position):\n')
+            msg = ['Multiple sample solutions found (choosing solution with '
+                   'shortest distance to all-zeros position):\n']
             i = 0
             for (pos_, _), distance in zip(pos_virtual_angles_pairs_in_degrees,
                                           relative_distances):
-                msg += '*' if i == shortest_solution_index else '.'
+                msg.append('*' if i == shortest_solution_index else '.')
 
-                msg += ('mu=% 7.3f, delta=% 7.3f, nu=% 7.3f, eta=% 7.3f, chi=% 7.3f, phi=% 7.3f' %
-                        pos_.totuple())
-                msg += ' (distance=%s)\n' % str(distance)
+                msg.append('mu=% 7.3f, delta=% 7.3f, nu=% 7.3f, eta=% 7.3f, chi=% 7.3f, phi=% 7.3f' %
+                           pos_.totuple())
+                msg.append(' (distance=%s)\n' % str(distance))
                 i += 1
-            msg += ':\n'
-            logger.debug(msg)
+            msg.append(':\n')
+            logger.debug(''.join(msg))
 
         return pos, virtual_angles
 
-    def hklToAngles(self, h, k, l, wavelength, return_all_solutions=False):
+    def hklToAngles(self, h, k, l, wavelength, return_all_solutions=False,
+                    verify=True):
         """
         Return verified Position and all virtual angles in degrees from
         h, k & l and wavelength in Angstroms.
@@ -323,23 +411,12 @@ class YouHklCalculator(HklCalculatorBase):
 
         Throws a DiffcalcException if either check fails and
         raiseExceptionsIfAnglesDoNotMapBackToHkl is True, otherwise displays a
-        warning.
+        warning. The check against hkl is skipped if verify is False.
         """
 
-        pos_virtual_angles_pairs = self._hklToAngles(h, k, l, wavelength, return_all_solutions)  # in rad
-        assert pos_virtual_angles_pairs
-        pos_virtual_angles_pairs_in_degrees = []
-        for pos, virtual_angles in pos_virtual_angles_pairs:
-            
-            # to degrees:
-            pos.changeToDegrees()
-            for key, val in virtual_angles.items():
-                if val is not None:
-                    virtual_angles[key] = val * TODEG
-
-            self._verify_pos_map_to_hkl(h, k, l, wavelength, pos)
-
-            pos_virtual_angles_pairs_in_degrees.append((pos, virtual_angles))
+        pos_virtual_angles_pairs_in_degrees = self._hklToAnglesInDegrees(
+            h, k, l, wavelength, return_all_solutions, verify)
+        assert pos_virtual_angles_pairs_in_degrees
 
         if return_all_solutions:
             return pos_virtual_angles_pairs_in_degrees
@@ -347,7 +424,8 @@ class YouHklCalculator(HklCalculatorBase):
             pos, virtual_angles = self._choose_single_solution(pos_virtual_angles_pairs_in_degrees)
             return pos, virtual_angles
 
-    def hklListToAngles(self, hkl_list, wavelength, return_all_solutions=False):
+    def hklListToAngles(self, hkl_list, wavelength, return_all_solutions=False,
+                        verify=True):
         """
         Return verified Position and all virtual angles in degrees from
         h, k & l and wavelength in Angstroms.
@@ -361,24 +439,24 @@ class YouHklCalculator(HklCalculatorBase):
 
         Throws a DiffcalcException if either check fails and
         raiseExceptionsIfAnglesDoNotMapBackToHkl is True, otherwise displays a
-        warning.
+        warning. The check against hkl is skipped if verify is False.
         """
 
+        # Transform all reflections into the phi frame with a single product
+        hkl_list = [list(hkl) for hkl in hkl_list]
+        if hkl_list:
+            h_phi_list = zip(*(self._get_ubmatrix() * matrix(hkl_list).T).tolist())
+        else:
+            h_phi_list = []
+
         pos_virtual_angles_pairs_in_degrees = []
-        for (h, k, l) in hkl_list:
+        for (h, k, l), (x, y, z) in zip(hkl_list, h_phi_list):
             try:
-                pos_virtual_angles_pairs = self._hklToAngles(h, k, l, wavelength, return_all_solutions)  # in rad
-                for pos, virtual_angles in pos_virtual_angles_pairs:
-                    
-                    # to degrees:
-                    pos.changeToDegrees()
-                    for key, val in virtual_angles.items():
-                        if val is not None:
-                            virtual_angles[key] = val * TODEG
-        
-                    self._verify_pos_map_to_hkl(h, k, l, wavelength, pos)
-        
-                    pos_virtual_angles_pairs_in_degrees.append((pos, virtual_angles))
+                h_phi = matrix([[x], [y], [z]])
+                pos_virtual_angles_pairs_in_degrees.extend(
+                    self._hklToAnglesInDegrees(h, k, l, wavelength,
+                                               return_all_solutions, verify,
+                                               h_phi))
             except DiffcalcException:
                 continue
         if not pos_virtual_angles_pairs_in_degrees:
@@ -392,14 +470,39 @@ class YouHklCalculator(HklCalculatorBase):
             return pos, virtual_angles
 
 
+    def _hklToAnglesInDegrees(self, h, k, l, wavelength, return_all_solutions,
+                              verify, h_phi=None):
+        """Return (pos, virtualAngles) pairs in degrees for one reflection,
+        each checked to map back to hkl if verify is True.
+        """
+        pos_virtual_angles_pairs = self._hklToAngles(h, k, l, wavelength, return_all_solutions,
+                                                     h_phi)  # in rad
+        for pos, virtual_angles in pos_virtual_angles_pairs:
+            
+            # to degrees:
+            pos.changeToDegrees()
+            for key, val in virtual_angles.items():
+                if val is not None:
+                    virtual_angles[key] = val * TODEG
+
+        if verify:
+            self._verify_positions_map_to_hkl(
+                h, k, l, wavelength,
+                [pos for pos, _ in pos_virtual_angles_pairs])
+        return pos_virtual_angles_pairs
+
     def hkl_to_all_angles(self, h, k, l, wavelength):
         return self.hklToAngles(h, k, l, wavelength, True)
 
 
-    def _hklToAngles(self, h, k, l, wavelength, return_all_solutions=False):
+    def _hklToAngles(self, h, k, l, wavelength, return_all_solutions=False,
+                     h_phi=None):
         """(pos, virtualAngles) = hklToAngles(h, k, l, wavelength) --- with
         Position object pos and the virtual angles returned in degrees. Some
         modes may not calculate all virtual angles.
+
+        h_phi may be given if UB * hkl has already been calculated by the
+        caller.
         """
 
         if not self.constraints.is_fully_constrained():
@@ -415,7 +518,7 @@ class YouHklCalculator(HklCalculatorBase):
         # constraints are dictionaries  
         ref_constraint = self.constraints.reference
         if ref_constraint:
-            ref_constraint_name, ref_constraint_value = ref_constraint.items()[0]
+            ref_constraint_name, ref_constraint_value = next(iter(ref_constraint.items()))
         det_constraint = self.constraints.detector
         naz_constraint = self.constraints.naz
         samp_constraints = self.constraints.sample
@@ -424,7 +527,8 @@ class YouHklCalculator(HklCalculatorBase):
                "Two 'detector' constraints given")
 
 
-        h_phi = self._get_ubmatrix() * matrix([[h], [k], [l]])
+        if h_phi is None:
+            h_phi = self._get_ubmatrix() * matrix([[h], [k], [l]])
         theta = self._calc_theta(h_phi, wavelength)
         tau = angle_between_vectors(h_phi, self._get_n_phi())
         surf_tau = angle_between_vectors(h_phi, self._get_surf_nphi())
@@ -445,11 +549,11 @@ class YouHklCalculator(HklCalculatorBase):
 
         n_phi = self._get_n_phi()
         if ref_constraint:
-            if set(['psi', 'a_eq_b', 'alpha', 'beta']).issuperset(ref_constraint.keys()):
+            if ref_constraint_name in ('psi', 'a_eq_b', 'alpha', 'beta'):
                 # An angle for the reference vector (n) is given      (Section 5.2)         
                 alpha, _ = self._calc_remaining_reference_angles(
                     ref_constraint_name, ref_constraint_value, theta, tau)
-            elif set(['bin_eq_bout', 'betain', 'betaout']).issuperset(ref_constraint.keys()):
+            elif ref_constraint_name in ('bin_eq_bout', 'betain', 'betaout'):
                 alpha, _ = self._calc_remaining_reference_angles(
                     ref_constraint_name, ref_constraint_value, theta, surf_tau)
                 tau = surf_tau
@@ -467,7 +571,7 @@ class YouHklCalculator(HklCalculatorBase):
 
             elif len(samp_constraints) == 2:
                 if det_constraint:
-                    det_constraint_name, det_constraint_val = det_constraint.items()[0]
+                    det_constraint_name, det_constraint_val = next(iter(det_constraint.items()))
                     for delta, nu, qaz in self._calc_remaining_detector_angles(det_constraint_name, det_constraint_val, theta):
                         for mu, eta, chi, phi in self._calc_sample_angles_given_two_sample_and_detector(
                             samp_constraints, qaz, theta, h_phi, n_phi):
@@ -498,7 +602,7 @@ class YouHklCalculator(HklCalculatorBase):
                 'Please consider using an alternative set of constraints.')
 
         tidy_solutions = [_tidy_degenerate_solutions(YouPosition(*pos, unit='RAD'),
-                                                     self.constraints).totuple() for pos in solution_tuples]
+                                                     self.constraints) for pos in solution_tuples]
         merged_solution_tuples = set(self._filter_angle_limits(tidy_solutions,
                                                                not return_all_solutions))
         if not merged_solution_tuples:
@@ -522,6 +626,12 @@ class YouHklCalculator(HklCalculatorBase):
 
     def _create_position_pseudo_angles_pairs(self, wavelength, merged_solution_tuples):
 
+        # Look up the constraints once rather than for every solution
+        constraint_items = [next(iter(constraint.items())) for constraint in
+                            (self.constraints.reference,
+                             self.constraints.detector,
+                             self.constraints.naz) if constraint]
+
         position_pseudo_angles_pairs = []
         for pos in merged_solution_tuples:
             # Create position
@@ -535,11 +645,8 @@ class YouHklCalculator(HklCalculatorBase):
             # same function and it will prove nothing
             pseudo_angles = self._anglesToVirtualAngles(position, wavelength)
             is_sol = True
-            for constraint in [self.constraints.reference,
-                               self.constraints.detector,
-                               self.constraints.naz]:
+            for constraint_name, constraint_value in constraint_items:
                 try:
-                    constraint_name, constraint_value = constraint.items()[0]
                     if constraint_name == 'a_eq_b':
                         diff = pseudo_angles['alpha'] - pseudo_angles['beta']
                     elif constraint_name == 'bin_eq_bout':
@@ -575,32 +682,32 @@ class YouHklCalculator(HklCalculatorBase):
         return theta
 
     def _calc_psi(self, alpha, theta, tau, qaz=None, naz=None):
-        """Calculate psi from Eq. (18), (25) and (28)
+        """Return a tuple of psi solutions from Eq. (18), (25) and (28)
         """
         sin_tau = sin(tau)
+        sin_theta = sin(theta)
         cos_theta = cos(theta)
         if is_small(sin_tau):
             # The reference vector is parallel to the scattering vector
-            yield float('nan')
+            return (float('nan'),)
         elif is_small(cos_theta):
             # Reflection is unreachable as theta angle is too close to 90 deg
-            yield float('nan')
-        elif is_small(sin(theta)):
+            return (float('nan'),)
+        elif is_small(sin_theta):
             # Reflection is unreachable as |Q| is too small
-            yield float('nan')
+            return (float('nan'),)
         else:
-            cos_psi = ((cos(tau) * sin(theta) - sin(alpha)) / cos_theta) # (28)
+            cos_psi = ((cos(tau) * sin_theta - sin(alpha)) / cos_theta) # (28)
             if qaz is None or naz is None :
                 try:
                     acos_psi = acos(bound(cos_psi / sin_tau))
                     if is_small(acos_psi):
-                        yield 0.
+                        return (0.,)
                     else:
-                        for psi in [acos_psi, -acos_psi]:
-                            yield psi
+                        return (acos_psi, -acos_psi)
                 except AssertionError:
                     print ('WARNING: Diffcalc could not calculate an azimuth (psi)')
-                    yield float('nan')
+                    return (float('nan'),)
             else:
                 sin_psi = cos(alpha) * sin(qaz - naz)
                 sgn = sign(sin_tau)
@@ -609,43 +716,45 @@ class YouHklCalculator(HklCalculatorBase):
                 if not is_small(sigma_):
                     print ('WARNING: Diffcalc could not calculate a unique azimuth '
                            '(psi) because of loss of accuracy in numerical calculation')
-                    yield float('nan')
+                    return (float('nan'),)
                 else:
                     psi = atan2(sgn * sin_psi, sgn * cos_psi)
-                    yield psi
+                    return (psi,)
 
 
     def _calc_remaining_reference_angles(self, name, value, theta, tau):
         """Return alpha and beta given one of a_eq_b, alpha, beta or psi
         """
+        # Shared by all branches of Equations 24, 26 and 27
+        ctau_st = cos(tau) * sin(theta)
         if name == 'psi':
             psi = value
+            ct_stau_cpsi = cos(theta) * sin(tau) * cos(psi)
             # Equation 26 for alpha
-            sin_alpha = (cos(tau) * sin(theta) -
-                         cos(theta) * sin(tau) * cos(psi))
+            sin_alpha = ctau_st - ct_stau_cpsi
             if abs(sin_alpha) > 1 + SMALL:
                 raise DiffcalcException(UNREACHABLE_MSG % (name, value * TODEG))
             alpha = asin(bound(sin_alpha))
             # Equation 27 for beta
-            sin_beta = cos(tau) * sin(theta) + cos(theta) * sin(tau) * cos(psi)
+            sin_beta = ctau_st + ct_stau_cpsi
             if abs(sin_beta) > 1 + SMALL:
                 raise DiffcalcException(UNREACHABLE_MSG % (name, value * TODEG))
 
             beta = asin(bound(sin_beta))
 
         elif name == 'a_eq_b' or name == 'bin_eq_bout':
-            alpha = beta = asin(cos(tau) * sin(theta))            # (24)
+            alpha = beta = asin(ctau_st)                                 # (24)
 
         elif name == 'alpha' or name == 'betain':
             alpha = value                                                # (24)
-            sin_beta = 2 * sin(theta) * cos(tau) - sin(alpha)
+            sin_beta = 2 * ctau_st - sin(alpha)
             if abs(sin_beta) > 1 + SMALL:
                 raise DiffcalcException(UNREACHABLE_MSG % (name, value * TODEG))
             beta = asin(sin_beta)
 
         elif name == 'beta' or name == 'betaout':
             beta = value
-            sin_alpha = 2 * sin(theta) * cos(tau) - sin(beta)            # (24)
+            sin_alpha = 2 * ctau_st - sin(beta)                          # (24)
             if abs(sin_alpha) > 1 + SMALL:
                 raise DiffcalcException(UNREACHABLE_MSG % (name, value * TODEG))
 
@@ -663,7 +772,7 @@ class YouHklCalculator(HklCalculatorBase):
             return
         if det_constraint:
             # One of the detector angles is given                 (Section 5.1)
-            det_constraint_name, det_constraint = det_constraint.items()[0]
+            det_constraint_name, det_constraint = next(iter(det_constraint.items()))
             for delta, nu, qaz in self._calc_remaining_detector_angles(
                                         det_constraint_name, det_constraint, theta):
                 if is_small(naz_qaz_angle):
@@ -673,7 +782,7 @@ class YouHklCalculator(HklCalculatorBase):
                 for naz in naz_angles:
                     yield qaz, naz, delta, nu
         elif naz_constraint: # The 'detector' angle naz is given:
-            det_constraint_name, det_constraint = naz_constraint.items()[0]
+            det_constraint_name, det_constraint = next(iter(naz_constraint.items()))
             naz_name, naz = det_constraint_name, det_constraint
             assert naz_name == 'naz'
             if is_small(naz_qaz_angle):
@@ -691,12 +800,7 @@ class YouHklCalculator(HklCalculatorBase):
         """
         #                                                         (section 5.1)
         # Find qaz using various derivations of 17 and 18
-        sin_2theta = sin(2 * theta)
-        cos_2theta = cos(2 * theta)
-        if is_small(sin_2theta):
-            raise DiffcalcException(
-                'No meaningful scattering vector (Q) can be found when '
-                'theta is so small (%.4f).' % theta * TODEG)
+        sin_2theta, cos_2theta = self._calc_sin_cos_2theta(theta)
 
         if constraint_name == 'delta':
             delta = constraint_value
@@ -726,9 +830,13 @@ class YouHklCalculator(HklCalculatorBase):
                 nu_angles = [0.,]
             else:
                 nu_angles = [acos_nu, -acos_nu]
-            for qaz, nu in product(qaz_angles, nu_angles):
-                sgn_ref = sign(sin_2theta) * sign(cos(qaz))
-                sgn_ratio = sign(sin(nu)) * sign(cos_delta)
+            # Evaluate the sign terms once per candidate angle rather than
+            # once per (qaz, nu) pair
+            sgn_sin_2theta = sign(sin_2theta)
+            sgn_cos_delta = sign(cos_delta)
+            qaz_sgn_refs = [(qaz, sgn_sin_2theta * sign(cos(qaz))) for qaz in qaz_angles]
+            nu_sgn_ratios = [(nu, sign(sin(nu)) * sgn_cos_delta) for nu in nu_angles]
+            for (qaz, sgn_ref), (nu, sgn_ratio) in product(qaz_sgn_refs, nu_sgn_ratios):
                 if sgn_ref == sgn_ratio:
                     yield delta, nu, qaz
 
@@ -754,71 +862,93 @@ class YouHklCalculator(HklCalculatorBase):
                 delta_angles = [0.,]
             else:
                 delta_angles = [acos_delta, -acos_delta]
-            for qaz, delta in product(qaz_angles, delta_angles):
-                sgn_ref = sign(sin(delta))
-                sgn_ratio = sign(sin(qaz)) * sign(sin_2theta)
+            sgn_sin_2theta = sign(sin_2theta)
+            qaz_sgn_ratios = [(qaz, sign(sin(qaz)) * sgn_sin_2theta) for qaz in qaz_angles]
+            delta_sgn_refs = [(delta, sign(sin(delta))) for delta in delta_angles]
+            for (qaz, sgn_ratio), (delta, sgn_ref) in product(qaz_sgn_ratios, delta_sgn_refs):
                 if sgn_ref == sgn_ratio:
                     yield delta, nu, qaz
 
         elif constraint_name == 'qaz':
             qaz = constraint_value
-            asin_delta = asin(sin(qaz) * sin_2theta)
-            if is_small(cos(asin_delta)):
-                delta_angles = [sign(asin_delta) * pi / 2.,]
-            else:
-                delta_angles = [asin_delta, pi - asin_delta]
-            for delta in delta_angles:
-                cos_delta = cos(delta)
-                if is_small(cos_delta):
-                    print (('DEGENERATE: with delta=90, %s is degenerate: choosing '
-                           '%s = 0 (allowed because %s is unconstrained)') %
-                           (NUNAME, NUNAME, NUNAME))
-                    #raise DiffcalcException(
-                    #    'The %s circle is redundant when delta is at %.0f degrees.'
-                    #    'Please change detector constraint or use 4-circle mode.' % (NUNAME, delta * TODEG))
-                    nu = 0.
-                else:
-                    sgn_delta = sign(cos_delta)
-                    nu = atan2(sgn_delta * sin_2theta * cos(qaz), sgn_delta * cos_2theta)
+            for delta, nu in self._calc_delta_and_nu_given_qaz(
+                    qaz, sin_2theta, cos_2theta):
                 yield delta, nu, qaz
         else:
             raise DiffcalcException(
                 constraint_name + ' is not an explicit detector angle '
                 '(naz cannot be handled here)')
 
+    def _calc_sin_cos_2theta(self, theta):
+        sin_2theta = sin(2 * theta)
+        if is_small(sin_2theta):
+            raise DiffcalcException(
+                'No meaningful scattering vector (Q) can be found when '
+                'theta is so small (%.4f).' % (theta * TODEG))
+        return sin_2theta, cos(2 * theta)
+
+    def _calc_delta_and_nu_given_qaz(self, qaz, sin_2theta, cos_2theta):
+        """Return delta and nu given qaz and precomputed sin/cos of 2theta
+        """
+        asin_delta = asin(sin(qaz) * sin_2theta)
+        if is_small(cos(asin_delta)):
+            delta_angles = [sign(asin_delta) * pi / 2.,]
+        else:
+            delta_angles = [asin_delta, pi - asin_delta]
+        for delta in delta_angles:
+            cos_delta = cos(delta)
+            if is_small(cos_delta):
+                print (('DEGENERATE: with delta=90, %s is degenerate: choosing '
+                       '%s = 0 (allowed because %s is unconstrained)') %
+                       (NUNAME, NUNAME, NUNAME))
+                #raise DiffcalcException(
+                #    'The %s circle is redundant when delta is at %.0f degrees.'
+                #    'Please change detector constraint or use 4-circle mode.' % (NUNAME, delta * TODEG))
+                nu = 0.
+            else:
+                sgn_delta = sign(cos_delta)
+                nu = atan2(sgn_delta * sin_2theta * cos(qaz), sgn_delta * cos_2theta)
+            yield delta, nu
+
 
     def _calc_sample_angles_from_one_sample_constraint(
             self, samp_constraints, h_phi, theta, alpha, qaz, naz, n_phi):
         
-        sample_constraint_name, sample_value = samp_constraints.items()[0]
+        sample_constraint_name, sample_value = next(iter(samp_constraints.items()))
         q_lab = matrix([[cos(theta) * sin(qaz)], 
                 [-sin(theta)], 
                 [cos(theta) * cos(qaz)]]) # (18)
         n_lab = matrix([[cos(alpha) * sin(naz)], 
                 [-sin(alpha)], 
                 [cos(alpha) * cos(naz)]]) # (20)
-        mu_eta_chi_phi_tuples = list(self._calc_remaining_sample_angles(
+        # The caller only iterates over the solutions, so hand back the
+        # generator rather than building a list first
+        return self._calc_remaining_sample_angles(
             sample_constraint_name, sample_value, q_lab, n_lab, h_phi, 
-            n_phi))
-        return mu_eta_chi_phi_tuples
+            n_phi)
 
     def _calc_sample_given_two_sample_and_reference(
             self, samp_constraints, h_phi, theta, psi, n_phi):
-        
+
+        # theta is shared by every candidate qaz below
+        sin_2theta, cos_2theta = self._calc_sin_cos_2theta(theta)
+        # Only build the debug messages if they will be logged
+        debug = logger.isEnabledFor(logging.DEBUG)
         for angles in self._calc_sample_angles_given_two_sample_and_reference(
                  samp_constraints, psi, theta, h_phi, n_phi):
             qaz, psi, mu, eta, chi, phi = angles 
-            values_in_deg = tuple(v * TODEG for v in angles)
-            logger.debug('Initial angles: xi=%.3f, psi=%.3f, mu=%.3f, '
-                'eta=%.3f, chi=%.3f, phi=%.3f' % 
-                values_in_deg) # Try to find a solution for each possible transformed xi
-
-            logger.debug("")
-            msg = "---Trying psi=%.3f, qaz=%.3f" % (psi * TODEG, qaz * TODEG)
-            logger.debug(msg)
+            if debug:
+                logger.debug('Initial angles: xi=%.3f, psi=%.3f, mu=%.3f, '
+                    'eta=%.3f, chi=%.3f, phi=%.3f', qaz * TODEG, psi * TODEG,
+                    mu * TODEG, eta * TODEG, chi * TODEG, phi * TODEG) # Try to find a solution for each possible transformed xi
+
+                logger.debug("")
+                logger.debug("---Trying psi=%.3f, qaz=%.3f", psi * TODEG, qaz * TODEG)
             
-            for delta, nu, _ in self._calc_remaining_detector_angles('qaz', qaz, theta):
-                logger.debug("delta=%.3f, %s=%.3f", delta * TODEG, NUNAME, nu * TODEG)
+            for delta, nu in self._calc_delta_and_nu_given_qaz(
+                    qaz, sin_2theta, cos_2theta):
+                if debug:
+                    logger.debug("delta=%.3f, %s=%.3f", delta * TODEG, NUNAME, nu * TODEG)
                 #for mu, eta, chi, phi in self._generate_sample_solutions(
                 #    mu, eta, chi, phi, samp_constraints.keys(), delta, 
                 #    nu, wavelength, (h, k, l), ref_constraint_name, 
@@ -832,13 +962,17 @@ class YouHklCalculator(HklCalculatorBase):
 
         N_lab = _calc_N(q_lab, n_lab)
         N_phi = _calc_N(q_phi, n_phi)
+        # N_lab and N_phi are orthonormal frames so the inverse of N_phi is
+        # its transpose
         Z = N_lab * N_phi.T
+        # Element access on nested lists is much cheaper than on matrices
+        z = Z.tolist()
 
         if constraint_name == 'mu':                                      # (35)
             mu = constraint_value
-            V = calcMU(mu).I * N_lab * N_phi.T
+            V = (calcMU(mu).T * Z).tolist()
             try:
-                acos_chi = acos(bound(V[2, 2]))
+                acos_chi = acos(bound(V[2][2]))
             except AssertionError:
                 return
             if is_small(sin(acos_chi)):
@@ -849,7 +983,7 @@ class YouHklCalculator(HklCalculatorBase):
                 # tan(phi+eta)=v12/v11 from docs/extensions_to_yous_paper.wxm
                 chi = acos_chi
                 eta = 0.
-                phi = atan2(-V[1, 0], V[1, 1])
+                phi = atan2(-V[1][0], V[1][1])
                 logger.debug(
                     'Eta and phi cannot be chosen uniquely with chi so close '
                     'to 0 or 180. Returning phi=%.3f and eta=%.3f', 
@@ -858,15 +992,15 @@ class YouHklCalculator(HklCalculatorBase):
             else:
                 for chi in [acos_chi, -acos_chi]:
                     sgn = sign(sin(chi))
-                    phi = atan2(-sgn * V[2, 1], -sgn * V[2, 0])
-                    eta = atan2(-sgn * V[1, 2],  sgn * V[0, 2])
+                    phi = atan2(-sgn * V[2][1], -sgn * V[2][0])
+                    eta = atan2(-sgn * V[1][2],  sgn * V[0][2])
                     yield mu, eta, chi, phi
 
         elif constraint_name == 'phi':                                     # (37)
             phi = constraint_value
-            V = N_lab * N_phi.I * calcPHI(phi).T
+            V = (Z * calcPHI(phi).T).tolist()
             try:
-                asin_eta = asin(bound(V[0, 1]))
+                asin_eta = asin(bound(V[0][1]))
             except AssertionError:
                 return
             if is_small(cos(asin_eta)):
@@ -874,8 +1008,8 @@ class YouHklCalculator(HklCalculatorBase):
                                         'with eta so close to +/-90.')
             for eta in [asin_eta, pi - asin_eta]:
                 sgn = sign(cos(eta))
-                mu = atan2(sgn * V[2, 1], sgn * V[1, 1])
-                chi = atan2(sgn * V[0, 2], sgn * V[0, 0])
+                mu = atan2(sgn * V[2][1], sgn * V[1][1])
+                chi = atan2(sgn * V[0][2], sgn * V[0][0])
                 yield mu, eta, chi, phi
 
         elif constraint_name in ('eta', 'chi'):
@@ -888,7 +1022,7 @@ class YouHklCalculator(HklCalculatorBase):
                         'Chi and mu cannot be chosen uniquely with eta '
                         'constrained so close to +-90.')
                 try:
-                    asin_chi = asin(bound(Z[0, 2] / cos_eta))
+                    asin_chi = asin(bound(z[0][2] / cos_eta))
                 except AssertionError:
                     return
                 all_eta = [eta,]
@@ -903,15 +1037,17 @@ class YouHklCalculator(HklCalculatorBase):
                         'constrained so close to 0. (Please contact developer '
                         'if this case is useful for you)')
                 try:
-                    acos_eta = acos(bound(Z[0, 2] / sin_chi))
+                    acos_eta = acos(bound(z[0][2] / sin_chi))
                 except AssertionError:
                     return
                 all_eta = [acos_eta, -acos_eta]
                 all_chi = [chi,]
 
             for chi, eta in product(all_chi, all_eta):
-                top_for_mu = Z[2, 2] * sin(eta) * sin(chi) + Z[1, 2] * cos(chi)
-                bot_for_mu = -Z[2, 2] * cos(chi) + Z[1, 2] * sin(eta) * sin(chi)
+                sc, cc = sin(chi), cos(chi)
+                se, ce = sin(eta), cos(eta)
+                top_for_mu = z[2][2] * se * sc + z[1][2] * cc
+                bot_for_mu = -z[2][2] * cc + z[1][2] * se * sc
                 if is_small(top_for_mu) and is_small(bot_for_mu):
                     # chi == +-90, eta == 0/180 and therefore phi || mu cos(chi) ==
                     # 0 and sin(eta) == 0 Experience shows that even though e.g.
@@ -933,8 +1069,8 @@ class YouHklCalculator(HklCalculatorBase):
                         'a different set of constraints.')
                 mu = atan2(-top_for_mu, -bot_for_mu)                         # (41)
 
-                top_for_phi = Z[0, 1] * cos(eta) * cos(chi) - Z[0, 0] * sin(eta)
-                bot_for_phi = Z[0, 1] * sin(eta) + Z[0, 0] * cos(eta) * cos(chi)
+                top_for_phi = z[0][1] * ce * cc - z[0][0] * se
+                bot_for_phi = z[0][1] * se + z[0][0] * ce * cc
                 if is_small(bot_for_phi) and is_small(top_for_phi):
                     DiffcalcException(
                         'Phi cannot be chosen uniquely as mu || phi with chi so close '
@@ -955,7 +1091,7 @@ class YouHklCalculator(HklCalculatorBase):
                 raise DiffcalcException(
                         'Sample orientation cannot be chosen uniquely. Please choose a different set of constraints.')
             ks = atan2(A, B)
-            acos_alp = acos(bound(C / sqrt(A**2 + B**2))) 
+            acos_alp = acos(bound(C / hypot(A, B))) 
             if is_small(acos_alp):
                 alp_list = [ks,]
             else:
@@ -972,6 +1108,7 @@ class YouHklCalculator(HklCalculatorBase):
             
         h_phi_norm = normalised(h_phi)                                    # (68,69) 
         h0, h1, h2 = h_phi_norm[0, 0], h_phi_norm[1, 0], h_phi_norm[2, 0]
+        debug = logger.isEnabledFor(logging.DEBUG)
 
         if not 'mu' in samp_constraints:
             eta = self.constraints.sample['eta']
@@ -987,9 +1124,11 @@ class YouHklCalculator(HklCalculatorBase):
                 return
             for mu in mu_vals:
                 qaz = __get_qaz_value(mu, eta, chi, phi)
-                logger.debug("--- Trying mu:%.f qaz_%.f", mu * TODEG, qaz * TODEG)
+                if debug:
+                    logger.debug("--- Trying mu:%.f qaz_%.f", mu * TODEG, qaz * TODEG)
                 for delta, nu, _ in self._calc_remaining_detector_angles('qaz', qaz, theta):
-                    logger.debug("delta=%.3f, %s=%.3f", delta * TODEG, NUNAME, nu * TODEG)
+                    if debug:
+                        logger.debug("delta=%.3f, %s=%.3f", delta * TODEG, NUNAME, nu * TODEG)
                     yield mu, delta, nu, eta, chi, phi
 
         elif not 'eta' in samp_constraints:
@@ -1006,9 +1145,11 @@ class YouHklCalculator(HklCalculatorBase):
                 return
             for eta in eta_vals:
                 qaz = __get_qaz_value(mu, eta, chi, phi)
-                logger.debug("--- Trying eta:%.f qaz_%.f", eta * TODEG, qaz * TODEG)
+                if debug:
+                    logger.debug("--- Trying eta:%.f qaz_%.f", eta * TODEG, qaz * TODEG)
                 for delta, nu, _ in self._calc_remaining_detector_angles('qaz', qaz, theta):
-                    logger.debug("delta=%.3f, %s=%.3f", delta * TODEG, NUNAME, nu * TODEG)
+                    if debug:
+                        logger.debug("delta=%.3f, %s=%.3f", delta * TODEG, NUNAME, nu * TODEG)
                     yield mu, delta, nu, eta, chi, phi
 
         elif not 'chi' in samp_constraints:
@@ -1025,9 +1166,11 @@ class YouHklCalculator(HklCalculatorBase):
                 return
             for chi in chi_vals:
                 qaz = __get_qaz_value(mu, eta, chi, phi)
-                logger.debug("--- Trying chi:%.f qaz_%.f", chi * TODEG, qaz * TODEG)
+                if debug:
+                    logger.debug("--- Trying chi:%.f qaz_%.f", chi * TODEG, qaz * TODEG)
                 for delta, nu, _ in self._calc_remaining_detector_angles('qaz', qaz, theta):
-                    logger.debug("delta=%.3f, %s=%.3f", delta * TODEG, NUNAME, nu * TODEG)
+                    if debug:
+                        logger.debug("delta=%.3f, %s=%.3f", delta * TODEG, NUNAME, nu * TODEG)
                     yield mu, delta, nu, eta, chi, phi
 
         elif not 'phi' in samp_constraints:
@@ -1044,9 +1187,11 @@ class YouHklCalculator(HklCalculatorBase):
                 return
             for phi in phi_vals:
                 qaz = __get_qaz_value(mu, eta, chi, phi)
-                logger.debug("--- Trying phi:%.f qaz_%.f", phi * TODEG, qaz * TODEG)
+                if debug:
+                    logger.debug("--- Trying phi:%.f qaz_%.f", phi * TODEG, qaz * TODEG)
                 for delta, nu, _ in self._calc_remaining_detector_angles('qaz', qaz, theta):
-                    logger.debug("delta=%.3f, %s=%.3f", delta * TODEG, NUNAME, nu * TODEG)
+                    if debug:
+                        logger.debug("delta=%.3f, %s=%.3f", delta * TODEG, NUNAME, nu * TODEG)
                     yield mu, delta, nu, eta, chi, phi
         else:
             raise DiffcalcException(
@@ -1064,21 +1209,24 @@ class YouHklCalculator(HklCalculatorBase):
         """
 
         def __get_phi_and_qaz(chi, eta, mu):
-            a = sin(chi) * cos(eta)
-            b = sin(chi) * sin(eta) * sin(mu) - cos(chi) * cos(mu)
-            #atan2_xi = atan2(V[2, 2] * a + V[2, 0] * b,
-            #           V[2, 0] * a - V[2, 2] * b)                        # (54)
-            qaz = atan2(V[2, 0] * a - V[2, 2] * b,
-                       -V[2, 2] * a - V[2, 0] * b)                        # (54)
+            sc, cc = sin(chi), cos(chi)
+            se, ce = sin(eta), cos(eta)
+            sm, cm = sin(mu), cos(mu)
+            a = sc * ce
+            b = sc * se * sm - cc * cm
+            #atan2_xi = atan2(V[2][2] * a + V[2][0] * b,
+            #           V[2][0] * a - V[2][2] * b)                        # (54)
+            qaz = atan2(V[2][0] * a - V[2][2] * b,
+                       -V[2][2] * a - V[2][0] * b)                        # (54)
     
-            a = sin(chi) * sin(mu) - cos(mu) * cos(chi) * sin(eta)
-            b = cos(mu) * cos(eta)
-            phi = atan2(V[1, 1] * a - V[0, 1] * b,
-                        V[0, 1] * a + V[1, 1] * b)                       # (55)
+            a = sc * sm - cm * cc * se
+            b = cm * ce
+            phi = atan2(V[1][1] * a - V[0][1] * b,
+                        V[0][1] * a + V[1][1] * b)                       # (55)
     #        if is_small(mu+pi/2) and is_small(eta) and False:
     #            phi_general = phi
     #            # solved in extensions_to_yous_paper.wxm
-    #            phi = atan2(V[1, 1], V[0, 1])
+    #            phi = atan2(V[1][1], V[0][1])
     #            logger.debug("phi = %.3f or %.3f (std)",
     #                        phi*TODEG, phi_general*TODEG )
     
@@ -1087,8 +1235,8 @@ class YouHklCalculator(HklCalculatorBase):
         def __get_chi_and_qaz(mu, eta):
             A = sin(mu)
             B = -cos(mu)*sin(eta)
-            sin_chi = A * V[1,0] + B * V[1,2]
-            cos_chi = B * V[1,0] - A * V[1,2]
+            sin_chi = A * V[1][0] + B * V[1][2]
+            cos_chi = B * V[1][0] - A * V[1][2]
             if is_small(sin_chi) and is_small(cos_chi):
                 raise DiffcalcException(
                         'Chi cannot be chosen uniquely. Please choose a different set of constraints.')
@@ -1096,8 +1244,8 @@ class YouHklCalculator(HklCalculatorBase):
 
             A = sin(eta)
             B = cos(eta)*sin(mu)
-            sin_qaz = A * V[0,1] + B * V[2,1]
-            cos_qaz = B * V[0,1] - A * V[2,1]
+            sin_qaz = A * V[0][1] + B * V[2][1]
+            cos_qaz = B * V[0][1] - A * V[2][1]
             qaz = atan2(sin_qaz, cos_qaz)
             return qaz, chi
 
@@ -1112,20 +1260,20 @@ class YouHklCalculator(HklCalculatorBase):
 
             CHI = calcCHI(chi)
             PHI = calcPHI(phi)
-            V = CHI * PHI * N_phi * PSI.T * THETA.T                     # (46)
+            V = (CHI * PHI * N_phi * PSI.T * THETA.T).tolist()          # (46)
 
-            #atan2_xi = atan2(-V[2, 0], V[2, 2])
-            #atan2_eta = atan2(-V[0, 1], V[1, 1])
-            #atan2_mu = atan2(-V[2, 1], sqrt(V[2, 2] ** 2 + V[2, 0] ** 2))
+            #atan2_xi = atan2(-V[2][0], V[2][2])
+            #atan2_eta = atan2(-V[0][1], V[1][1])
+            #atan2_mu = atan2(-V[2][1], sqrt(V[2][2] ** 2 + V[2][0] ** 2))
             try:
-                asin_mu = asin(bound(-V[2, 1]))
+                asin_mu = asin(bound(-V[2][1]))
             except AssertionError:
                 return
             for mu in [asin_mu, pi - asin_mu]:
                 sgn_cosmu = sign(cos(mu))
-                #xi = atan2(-sgn_cosmu * V[2, 0], sgn_cosmu * V[2, 2])
-                qaz = atan2(sgn_cosmu * V[2, 2], sgn_cosmu * V[2, 0], )
-                eta = atan2(-sgn_cosmu * V[0, 1], sgn_cosmu * V[1, 1])
+                #xi = atan2(-sgn_cosmu * V[2][0], sgn_cosmu * V[2][2])
+                qaz = atan2(sgn_cosmu * V[2][2], sgn_cosmu * V[2][0], )
+                eta = atan2(-sgn_cosmu * V[0][1], sgn_cosmu * V[1][1])
                 yield qaz, psi, mu, eta, chi, phi
 
         elif 'mu' in samp_constraints and 'eta' in samp_constraints:
@@ -1133,10 +1281,10 @@ class YouHklCalculator(HklCalculatorBase):
             mu = samp_constraints['mu']
             eta = samp_constraints['eta']
 
-            V = N_phi * PSI.T * THETA.T                                  # (49)
+            V = (N_phi * PSI.T * THETA.T).tolist()                       # (49)
             try:
-                bot = bound(-V[2, 1] / sqrt(sin(eta) ** 2 * cos(mu) ** 2 + sin(mu) ** 2))
-            except AssertionError:
+                bot = bound(-V[2][1] / hypot(sin(eta) * cos(mu), sin(mu)))
+            except (AssertionError, ZeroDivisionError):
                 return
             if is_small(cos(mu) * sin(eta)):
                 eps = atan2(sin(eta) * cos(mu), sin(mu))
@@ -1164,10 +1312,10 @@ class YouHklCalculator(HklCalculatorBase):
             chi = samp_constraints['chi']
             eta = samp_constraints['eta']
 
-            V = N_phi * PSI.T * THETA.T                                  # (49)
+            V = (N_phi * PSI.T * THETA.T).tolist()                       # (49)
             try:
-                bot = bound(-V[2, 1] / sqrt(sin(eta) ** 2 * sin(chi) ** 2 + cos(chi) ** 2))
-            except AssertionError:
+                bot = bound(-V[2][1] / hypot(sin(eta) * sin(chi), cos(chi)))
+            except (AssertionError, ZeroDivisionError):
                 return
             if is_small(cos(chi)):
                 eps = atan2(cos(chi), sin(chi) * sin(eta))
@@ -1185,11 +1333,11 @@ class YouHklCalculator(HklCalculatorBase):
             chi = samp_constraints['chi']
             mu = samp_constraints['mu']
 
-            V = N_phi * PSI.T * THETA.T                                  # (49)
+            V = (N_phi * PSI.T * THETA.T).tolist()                       # (49)
 
             try:
-                asin_eta = asin(bound((-V[2, 1] - cos(chi) * sin(mu)) / (sin(chi) * cos(mu))))
-            except AssertionError:
+                asin_eta = asin(bound((-V[2][1] - cos(chi) * sin(mu)) / (sin(chi) * cos(mu))))
+            except (AssertionError, ZeroDivisionError):
                 return
 
             for eta in [asin_eta, pi - asin_eta]:
@@ -1202,13 +1350,13 @@ class YouHklCalculator(HklCalculatorBase):
             phi = samp_constraints['phi']
 
             PHI = calcPHI(phi)
-            V = THETA * PSI * N_phi.I * PHI.T
+            V = (THETA * PSI * N_phi.T * PHI.T).tolist()
 
             if is_small(cos(mu)):
                 raise DiffcalcException(
                             'Eta cannot be chosen uniquely. Please choose a different set of constraints.')
             try:
-                acos_eta = acos(bound(V[1,1] / cos(mu)))
+                acos_eta = acos(bound(V[1][1] / cos(mu)))
             except AssertionError:
                 return
             for eta in [acos_eta, -acos_eta]:
@@ -1221,13 +1369,13 @@ class YouHklCalculator(HklCalculatorBase):
             phi = samp_constraints['phi']
 
             PHI = calcPHI(phi)
-            V = THETA * PSI * N_phi.I * PHI.T
+            V = (THETA * PSI * N_phi.T * PHI.T).tolist()
 
             if is_small(cos(eta)):
                 raise DiffcalcException(
                             'Mu cannot be chosen uniquely. Please choose a different set of constraints.')
             try:
-                acos_mu = acos(bound(V[1,1] / cos(eta)))
+                acos_mu = acos(bound(V[1][1] / cos(eta)))
             except AssertionError:
                 return
             for mu in [acos_mu, -acos_mu]:
@@ -1325,7 +1473,7 @@ class YouHklCalculator(HklCalculatorBase):
                                 'Phi cannot be chosen uniquely as q || phi and no reference '
                                 'vector or phi constraints have been set.\nPlease choose a different '
                                 'set of constraints.')
-                    bot = bound(-V[1, 0] / sqrt(N_phi[0, 0]**2 + N_phi[1, 0]**2))
+                    bot = bound(-V[1, 0] / hypot(N_phi[0, 0], N_phi[1, 0]))
                     eps = atan2(N_phi[1, 0], N_phi[0, 0])
                     phi_vals = [asin(bot) + eps, pi - asin(bot) + eps]              # (59)
                 except AssertionError:
@@ -1346,7 +1494,7 @@ class YouHklCalculator(HklCalculatorBase):
             V = CHI * PHI * N_phi                     # (62)
 
             try:
-                bot = bound(V[2, 0] / sqrt(cos(qaz) ** 2 * cos(theta) ** 2 + sin(theta) ** 2))
+                bot = bound(V[2, 0] / hypot(cos(qaz) * cos(theta), sin(theta)))
             except AssertionError:
                 return
             eps = atan2(-cos(qaz) * cos(theta), sin(theta))
@@ -1378,7 +1526,7 @@ class YouHklCalculator(HklCalculatorBase):
             E = calcPHI(phi) * N_phi
             
             try:
-                bot = bound(-V[2, 0] / sqrt(E[0, 0]**2 + E[2, 0]**2))
+                bot = bound(-V[2, 0] / hypot(E[0, 0], E[2, 0]))
             except AssertionError:
                 return
             eps = atan2(E[2, 0], E[0, 0])
@@ -1404,7 +1552,7 @@ class YouHklCalculator(HklCalculatorBase):
             else:
                 ks = atan2(A, B)
             try:
-                acos_phi = acos(bound((N_phi[2,0]*cos(chi) - V20)/(sin(chi) * sqrt(A**2 + B**2))))
+                acos_phi = acos(bound((N_phi[2,0]*cos(chi) - V20)/(sin(chi) * hypot(A, B))))
             except AssertionError:
                 return
             if is_small(acos_phi):
@@ -1441,7 +1589,7 @@ class YouHklCalculator(HklCalculatorBase):
             sgn = sign(cos(eta))
             eps = atan2(X*sgn, Y*sgn)
             try:
-                acos_rhs = acos(bound((sin(qaz)*cos(theta)/cos(eta) - V) / sqrt(X**2 + Y**2)))
+                acos_rhs = acos(bound((sin(qaz)*cos(theta)/cos(eta) - V) / hypot(X, Y)))
             except AssertionError:
                 return
             if is_small(acos_rhs):
@@ -1469,7 +1617,7 @@ class YouHklCalculator(HklCalculatorBase):
             else:
                 ks = atan2(A, B)
             try:
-                acos_V00 = acos(bound((cos(theta)*sin(qaz) - N_phi[2,0]*cos(eta)*sin(chi))/sqrt(A**2 + B**2)))
+                acos_V00 = acos(bound((cos(theta)*sin(qaz) - N_phi[2,0]*cos(eta)*sin(chi))/hypot(A, B)))
             except AssertionError:
                 return
             if is_small(acos_V00):
@@ -1499,19 +1647,26 @@ class YouHklCalculator(HklCalculatorBase):
                 'constraints and one detector!:' + str(samp_constraints))
 
     def _filter_angle_limits(self, possible_solutions, filter_out_of_limits=True):
+        """Return the solutions within the hardware limits as angle tuples
+        in radians, given solutions as YouPosition objects.
+        """
         res = []
-        angle_names = settings.hardware.get_axes_names()
+        # Fetch the adapters, axis names and cuts once per call rather than
+        # for every solution
+        hardware = settings.hardware
+        geometry = settings.geometry
+        cuts = hardware.get_cuts()
+        angle_cuts = [cuts[name] for name in hardware.get_axes_names()]
         for possible_solution in possible_solutions:
-            hw_sol = []
-            hw_possible_solution = settings.geometry.internal_position_to_physical_angles(YouPosition(*possible_solution, unit='RAD'))
-            for name, value in zip(angle_names, hw_possible_solution):
-                hw_sol.append(settings.hardware.cut_angle(name, value))
+            hw_possible_solution = geometry.internal_position_to_physical_angles(possible_solution)
+            hw_sol = [value if cut is None else cut_angle_at(cut, value)
+                      for cut, value in zip(angle_cuts, hw_possible_solution)]
             if filter_out_of_limits:
-                is_in_limits = settings.hardware.is_position_within_limits(hw_sol)
+                is_in_limits = hardware.is_position_within_limits(hw_sol)
             else:
                 is_in_limits = True
             if is_in_limits:
-                sol = settings.geometry.physical_angles_to_internal_position(tuple(hw_sol))
+                sol = geometry.physical_angles_to_internal_position(tuple(hw_sol))
                 sol.changeToRadians()
                 res.append(sol.totuple())
         return res
@@ -51,6 +51,10 @@ all_constraints = det_constraints + ref_constraints + samp_constraints
 number_single_sample = (len(det_constraints) * len(ref_constraints) *
                         len(samp_constraints))
 
+# Whether a mode is implemented depends only on the names constrained, so the
+# result is remembered per combination rather than worked out for every hkl.
+_implemented_modes = {}
+
 
 class YouConstraintManager(object):
 
@@ -235,7 +239,16 @@ class YouConstraintManager(object):
     def is_current_mode_implemented(self):
         if not self.is_fully_constrained():
             raise ValueError("Three constraints required")
-        
+
+        names = frozenset(self._constrained)
+        try:
+            return _implemented_modes[names]
+        except KeyError:
+            implemented = self._is_mode_implemented()
+            _implemented_modes[names] = implemented
+            return implemented
+
+    def _is_mode_implemented(self):
         if len(self.sample) == 3:
             if (set(self.sample.keys()) == set(['chi', 'phi', 'eta']) or
                set(self.sample.keys()) == set(['chi', 'phi', 'mu']) or
@@ -309,7 +322,7 @@ class YouConstraintManager(object):
             self._constrained[name] = None
             return 'Naz constraint replaced.'
         elif self.detector:
-            constrained_name = self.detector.keys()[0]
+            constrained_name = next(iter(self.detector))
             del self._constrained[constrained_name]
             self._constrained[name] = None
             return'%s constraint replaced.' % constrained_name.capitalize()
@@ -332,7 +345,7 @@ class YouConstraintManager(object):
 
     def _constrain_reference(self, name):
         if self.reference:
-            constrained_name = self.reference.keys()[0]
+            constrained_name = next(iter(self.reference))
         elif len(self._constrained) < 3:
             constrained_name = None
         elif len(self.available_names) == 1:
@@ -356,7 +369,7 @@ class YouConstraintManager(object):
         elif len(self.sample) == 1:
             # (detector and reference constraints set)
             # it is clear which sample constraint to remove
-            constrained_name = self.sample.keys()[0]
+            constrained_name = next(iter(self.sample))
             if self.is_constraint_fixed(constrained_name):
                 raise self._could_not_constrain_exception(name)
         else:
@@ -16,7 +16,7 @@
 # along with Diffcalc.  If not, see <http://www.gnu.org/licenses/>.
 ###
 
-from math import pi
+from math import pi, sin, cos
 
 from diffcalc.util import AbstractPosition, DiffcalcException
 from diffcalc import settings
@@ -234,6 +234,62 @@ def calcPHI(phi):
     return z_rotation(-phi)
 
 
+# The apply_* functions rotate a vector given as an (x, y, z) tuple by a
+# single circle. They are equivalent to multiplying a column vector by the
+# matrix returned by the corresponding calc* function, but avoid building
+# the matrix. Pass the negative angle to apply the inverse rotation. The
+# rotate_* functions do the same given the cosine and sine of the angle.
+
+def rotate_mu(v, c, s):
+    x, y, z = v
+    return x, c * y - s * z, s * y + c * z
+
+
+def rotate_eta(v, c, s):
+    x, y, z = v
+    return c * x + s * y, c * y - s * x, z
+
+
+def rotate_chi(v, c, s):
+    x, y, z = v
+    return c * x + s * z, y, c * z - s * x
+
+
+# PHI and ETA are both rotations about z
+rotate_phi = rotate_eta
+
+
+def apply_mu(v, mu):
+    return rotate_mu(v, cos(mu), sin(mu))
+
+
+def apply_eta(v, eta):
+    return rotate_eta(v, cos(eta), sin(eta))
+
+
+def apply_chi(v, chi):
+    return rotate_chi(v, cos(chi), sin(chi))
+
+
+def apply_phi(v, phi):
+    return rotate_phi(v, cos(phi), sin(phi))
+
+
+def sample_trig(mu, eta, chi, phi):
+    """Return the cosines and sines of the sample angles for phi_to_lab."""
+    return ((cos(mu), sin(mu)), (cos(eta), sin(eta)),
+            (cos(chi), sin(chi)), (cos(phi), sin(phi)))
+
+
+def phi_to_lab(v, trig):
+    """Return MU * ETA * CHI * PHI * v given trig from sample_trig."""
+    (cm, sm), (ce, se), (cc, sc), (cp, sp) = trig
+    v = rotate_phi(v, cp, sp)
+    v = rotate_chi(v, cc, sc)
+    v = rotate_eta(v, ce, se)
+    return rotate_mu(v, cm, sm)
+
+
 class YouPosition(AbstractPosition):
 
     def __init__(self, mu, delta, nu, eta, chi, phi, unit):
@@ -195,6 +195,8 @@ def bound(x):
     moves x between -1 and 1. Used to correct for rounding errors which may
     have moved the sin or cosine of a value outside this range.
     """
+    if -1 <= x <= 1:
+        return x
     if abs(x) > (1 + SMALL):
         raise AssertionError(
             "The value (%f) was unexpectedly too far outside -1 or 1 to "
@@ -203,7 +205,7 @@ def bound(x):
         return 1
     if x < -1:
         return -1
-    return x
+    return x  # nan
 
 
 def matrixToString(m):
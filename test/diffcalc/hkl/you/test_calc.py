@@ -227,6 +227,62 @@ class TestCubicVertical_aeqb(_TestCubicVertical):
         _TestCubicVertical.setup_method(self)
         self.constraints._constrained = {'a_eq_b': None, 'mu': 0, NUNAME: 0}
 
+    def test_hkl_list_to_angles_matches_single_reflections(self):
+        self.zrot, self.yrot = 1, 2
+        self._configure_ub()
+        hkl_list = [(1, 0, 0), (0, 1, 0), (0.1, 0, 1.5)]
+        expected = []
+        for h, k, l in hkl_list:
+            expected.extend(self.calc.hkl_to_all_angles(h, k, l, 1))
+        result = self.calc.hklListToAngles(hkl_list, 1, True)
+        assert len(result) == len(expected)
+        key = lambda pair: tuple(round(v, self.places) for v in pair[0].totuple())
+        for (pos, virtual), (pos_e, virtual_e) in zip(sorted(result, key=key),
+                                                      sorted(expected, key=key)):
+            assert_array_almost_equal(pos.totuple(), pos_e.totuple(), self.places)
+            assert_second_dict_almost_in_first(virtual, virtual_e)
+
+    @raises(DiffcalcException)
+    def test_hkl_list_to_angles_empty_list(self):
+        self.zrot, self.yrot = 1, 2
+        self._configure_ub()
+        self.calc.hklListToAngles([], 1)
+
+    def test_hkl_to_angles_without_verify(self):
+        self.zrot, self.yrot = 1, 2
+        self._configure_ub()
+        pos_e, virtual_e = self.calc.hklToAngles(1, 0, 0, 1)
+        self.calc._verify_positions_map_to_hkl = Mock(side_effect=AssertionError)
+        pos, virtual = self.calc.hklToAngles(1, 0, 0, 1, verify=False)
+        assert_array_almost_equal(pos.totuple(), pos_e.totuple(), self.places)
+        assert_second_dict_almost_in_first(virtual, virtual_e)
+
+
+class TestCubic_degenerate_sample_and_reference(_TestCubic):
+    """Sample constraints for which the two sample and reference solution
+    divides by zero must report no solution rather than crash"""
+
+    def _check_no_solution(self, constrained):
+        self.zrot, self.yrot = 1, 2
+        self._configure_ub()
+        self.constraints._constrained = constrained
+        for hkl in ((1, 0, 0), (0, 0, 1)):
+            try:
+                self.calc.hklToAngles(hkl[0], hkl[1], hkl[2], 1)
+            except DiffcalcException:
+                pass
+            else:
+                raise AssertionError('Expected DiffcalcException for %s' % (hkl,))
+
+    def test_mu_eta_zero_psi(self):
+        self._check_no_solution({'psi': 30 * TORAD, 'mu': 0, 'eta': 0})
+
+    def test_mu_eta_zero_a_eq_b(self):
+        self._check_no_solution({'a_eq_b': None, 'mu': 0, 'eta': 0})
+
+    def test_chi_mu_zero_psi(self):
+        self._check_no_solution({'psi': 0, 'chi': 0, 'mu': 0})
+
 
 class TestCubicVertical_psi_90(_TestCubicVertical):
     '''mode psi=90 should be the same as mode a_eq_b'''
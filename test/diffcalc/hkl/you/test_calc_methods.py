@@ -29,10 +29,11 @@ except ImportError:
     from numjy import matrix
 
 from diffcalc.hkl.you.calc import YouHklCalculator, I, \
-    _calc_angle_between_naz_and_qaz
+    _calc_angle_between_naz_and_qaz, _calc_N, YouUbCalcStrategy, sign
 from test.tools import  assert_array_almost_equal, \
     assert_matrix_almost_equal
-from diffcalc.hkl.you.geometry  import YouPosition, SixCircle
+from diffcalc.hkl.you.geometry  import YouPosition, SixCircle, \
+    create_you_matrices
 
 from test.diffcalc.hkl.you.test_calc import createMockHardwareMonitor, createMockUbcalc
 from diffcalc.util import DiffcalcException
@@ -264,6 +265,45 @@ class Test_calc_theta():
         self.calc._calc_theta(h_phi * 2 * pi, 10)
 
 
+class Test_anglesToHkl():
+
+    def setup_method(self):
+        settings.hardware = createMockHardwareMonitor()
+        settings.geometry = SixCircle()
+        self.ubcalc = createMockUbcalc(I * 2 * pi)
+        self.calc = YouHklCalculator(self.ubcalc, Mock())
+
+    def test_100(self):
+        pos = YouPosition(0, 60, 0, 30, 0, 0, unit='DEG')
+        pos.changeToRadians()
+        assert_array_almost_equal(self.calc._anglesToHkl(pos, 1), (1, 0, 0))
+
+    def test_cached_ub_inverse_follows_new_ub(self):
+        pos = YouPosition(0, 60, 0, 30, 0, 0, unit='DEG')
+        pos.changeToRadians()
+        self.calc._anglesToHkl(pos, 1)
+        self.ubcalc.UB = I * pi
+        assert_array_almost_equal(self.calc._anglesToHkl(pos, 1), (2, 0, 0))
+
+    def test_repeated_position_follows_new_wavelength(self):
+        pos = YouPosition(0, 60, 0, 30, 0, 0, unit='DEG')
+        pos.changeToRadians()
+        assert_array_almost_equal(self.calc._anglesToHkl(pos, 1), (1, 0, 0))
+        assert_array_almost_equal(self.calc._anglesToHkl(pos, 1), (1, 0, 0))
+        assert_array_almost_equal(self.calc._anglesToHkl(pos, .5), (2, 0, 0))
+
+    def test_verify_positions_map_to_hkl(self):
+        positions = [YouPosition(0, 60, 0, 30, 0, 0, unit='DEG'),
+                     YouPosition(0, 60, 0, 30, 0, 360, unit='DEG')]
+        self.calc._verify_positions_map_to_hkl(1, 0, 0, 1, positions)
+
+    @raises(DiffcalcException)
+    def test_verify_positions_map_to_hkl_fails(self):
+        positions = [YouPosition(0, 60, 0, 30, 0, 0, unit='DEG'),
+                     YouPosition(0, 60, 0, 30, 0, 90, unit='DEG')]
+        self.calc._verify_positions_map_to_hkl(1, 0, 0, 1, positions)
+
+
 class Test_calc_remaining_reference_angles_given_one():
 
     # TODO: These are very incomplete due to either totally failing inutuition
@@ -391,6 +431,47 @@ class Test_calc_angle_between_naz_and_qaz():
         assert_almost_equal(diff * TODEG, 80)
 
 
+class Test_sign():
+
+    def test_sign(self):
+        eq_(sign(0.5), 1)
+        eq_(sign(-0.5), -1)
+        eq_(sign(1e-9), 0)
+        eq_(sign(-1e-9), 0)
+
+    def test_nan(self):
+        eq_(sign(float('nan')), -1)
+
+
+class Test_calculate_q_phi():
+
+    def test_matches_rotation_matrices(self):
+        pos = YouPosition(10, 50, 20, 30, 40, 60, unit='DEG')
+        pos.changeToRadians()
+        MU, DELTA, NU, ETA, CHI, PHI = create_you_matrices(*pos.totuple())
+        expected = PHI.T * CHI.T * ETA.T * MU.T * (NU * DELTA - I) * y
+        assert_matrix_almost_equal(YouUbCalcStrategy().calculate_q_phi(pos),
+                                   expected)
+
+
+class Test_calc_N():
+
+    def test_perpendicular(self):
+        N = _calc_N(x * 2, z)
+        assert_matrix_almost_equal(N, matrix('1 0 0; 0 0 -1; 0 1 0'))
+
+    def test_parallel_uses_alternative_reference(self):
+        N = _calc_N(matrix('1; 1; 0'), matrix('2; 2; 0'))
+        assert_matrix_almost_equal(N.T * N, I)
+        assert_almost_equal(N[0, 0], 1 / math.sqrt(2))
+        assert_almost_equal(N[1, 0], 1 / math.sqrt(2))
+
+    def test_antiparallel_uses_alternative_reference(self):
+        N = _calc_N(matrix('0; 0; 1'), matrix('0; 0; -1'))
+        assert_matrix_almost_equal(N.T * N, I)
+        assert_matrix_almost_equal(N[:, 0], matrix('0; 0; 1'))
+
+
 class Test_calc_remaining_sample_angles_given_one():
     #_calc_remaining_detector_angles_given_one
     def setup_method(self):
@@ -0,0 +1,68 @@
+###
+# Copyright 2008-2011 Diamond Light Source Ltd.
+# This file is part of Diffcalc.
+#
+# Diffcalc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Diffcalc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Diffcalc.  If not, see <http://www.gnu.org/licenses/>.
+###
+
+from math import pi
+
+try:
+    from numpy import matrix
+except ImportError:
+    from numjy import matrix
+
+from diffcalc.hkl.you.geometry import calcMU, calcETA, calcCHI, calcPHI, \
+    apply_mu, apply_eta, apply_chi, apply_phi, sample_trig, phi_to_lab
+from test.tools import assert_array_almost_equal
+
+TORAD = pi / 180
+
+
+class TestApplyRotations(object):
+
+    def _check(self, apply_func, calc_func, angle):
+        v = (0.3, -1.2, 0.7)
+        expected = calc_func(angle) * matrix([[v[0]], [v[1]], [v[2]]])
+        assert_array_almost_equal(apply_func(v, angle),
+                                  [expected[0, 0], expected[1, 0], expected[2, 0]])
+
+    def test_apply_mu(self):
+        for angle in (0, 30, -120, 270):
+            self._check(apply_mu, calcMU, angle * TORAD)
+
+    def test_apply_eta(self):
+        for angle in (0, 30, -120, 270):
+            self._check(apply_eta, calcETA, angle * TORAD)
+
+    def test_apply_chi(self):
+        for angle in (0, 30, -120, 270):
+            self._check(apply_chi, calcCHI, angle * TORAD)
+
+    def test_apply_phi(self):
+        for angle in (0, 30, -120, 270):
+            self._check(apply_phi, calcPHI, angle * TORAD)
+
+    def test_negative_angle_is_inverse(self):
+        v = (0.3, -1.2, 0.7)
+        for apply_func in (apply_mu, apply_eta, apply_chi, apply_phi):
+            assert_array_almost_equal(apply_func(apply_func(v, 40 * TORAD), -40 * TORAD), v)
+
+    def test_phi_to_lab(self):
+        v = (0.3, -1.2, 0.7)
+        mu, eta, chi, phi = 10 * TORAD, -35 * TORAD, 70 * TORAD, 200 * TORAD
+        expected = (calcMU(mu) * calcETA(eta) * calcCHI(chi) * calcPHI(phi) *
+                    matrix([[v[0]], [v[1]], [v[2]]]))
+        assert_array_almost_equal(phi_to_lab(v, sample_trig(mu, eta, chi, phi)),
+                                  [expected[0, 0], expected[1, 0], expected[2, 0]])
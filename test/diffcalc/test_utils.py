@@ -22,7 +22,7 @@ from nose.tools import eq_  # @UnresolvedImport
 from diffcalc.hkl.vlieg.geometry import VliegPosition
 from diffcalc.util import MockRawInput, \
     getInputWithDefault, differ, nearlyEqual, degreesEquivilant,\
-    CoordinateConverter
+    CoordinateConverter, bound
 import diffcalc.util  # @UnusedImport
 import pytest
 
@@ -109,6 +109,18 @@ class TestUtils(object):
         assert not degreesEquivilant(1.1, -359, tol)
         assert not degreesEquivilant(359.1, -1, tol)
 
+    def testBound(self):
+        assert bound(0.5) == 0.5
+        assert bound(-1) == -1
+        assert bound(1 + 1e-12) == 1
+        assert bound(-1 - 1e-12) == -1
+        nan = bound(float('nan'))
+        assert nan != nan
+        with pytest.raises(AssertionError):
+            bound(1.1)
+        with pytest.raises(AssertionError):
+            bound(-1.1)
+
 
 class TestPosition(object):
 